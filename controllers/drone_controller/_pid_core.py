@@ -0,0 +1,137 @@
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# State vector layout (float64): filtered roll/pitch/yaw, filtered gyro x/y/z,
+# smoothed roll/pitch/yaw commands, roll/pitch/yaw integrals
+FILT = slice(0, 3)
+FILT_GYRO = slice(3, 6)
+SMOOTH = slice(6, 9)
+INTEGRAL = slice(9, 12)
+STATE_SIZE = 12
+
+# Parameter vector layout (float64)
+P_ALPHA = 0
+P_SMOOTHING = 1
+P_VERTICAL_THRUST = 2
+P_VERTICAL_OFFSET = 3
+P_VERTICAL_P = 4
+P_ROLL_P = 5
+P_PITCH_P = 6
+P_YAW_P = 7
+P_ROLL_D = 8
+P_PITCH_D = 9
+P_YAW_D = 10
+P_MAX_ROLL_RATE = 11
+P_MAX_PITCH_RATE = 12
+P_MAX_YAW_RATE = 13
+P_INTEGRAL_LIMIT = 14
+P_INTEGRAL_DECAY = 15
+PARAM_SIZE = 16
+
+
+def new_state():
+    """Zeroed state vector: a float64 array under Numba, a plain list when the kernel runs interpreted"""
+    return np.zeros(STATE_SIZE) if NUMBA_AVAILABLE else [0.0] * STATE_SIZE
+
+
+def new_params():
+    """Parameter vector to fill with the P_* indices, in the form step() reads fastest"""
+    return np.zeros(PARAM_SIZE) if NUMBA_AVAILABLE else [0.0] * PARAM_SIZE
+
+
+def _step_floats(roll, pitch, yaw, gx, gy, gz, altitude, target_altitude,
+                 target_roll, target_pitch, target_yaw, user_yaw_input, dt, state, params):
+    """Advance filters, PID and motor mixing by one tick.
+
+    Updates ``state`` in place and returns the clamped (FL, FR, RL, RR) motor commands. State and
+    params are unpacked into locals and clamps are inline conditionals, so the same source runs
+    fast both under Numba (float64 arrays) and interpreted (plain lists, see new_state()).
+    """
+    (f_roll, f_pitch, f_yaw, f_gx, f_gy, f_gz,
+     s_roll, s_pitch, s_yaw, i_roll, i_pitch, i_yaw) = state
+    (alpha, smoothing, vertical_thrust, vertical_offset, vertical_p, roll_p, pitch_p, yaw_p,
+     roll_d, pitch_d, yaw_d, max_roll_rate, max_pitch_rate, max_yaw_rate, limit, decay) = params
+    beta = 1.0 - alpha
+    blend = 1.0 - smoothing
+
+    # Filtering
+    f_roll = alpha * f_roll + beta * roll
+    f_pitch = alpha * f_pitch + beta * pitch
+    f_yaw = alpha * f_yaw + beta * yaw
+    f_gx = alpha * f_gx + beta * gx
+    f_gy = alpha * f_gy + beta * gy
+    f_gz = alpha * f_gz + beta * gz
+
+    # Movement smoothing and rate limiting
+    s_roll = smoothing * s_roll + blend * target_roll
+    s_roll = -max_roll_rate if s_roll < -max_roll_rate else max_roll_rate if s_roll > max_roll_rate else s_roll
+    s_pitch = smoothing * s_pitch + blend * target_pitch
+    s_pitch = -max_pitch_rate if s_pitch < -max_pitch_rate else max_pitch_rate if s_pitch > max_pitch_rate else s_pitch
+    s_yaw = smoothing * s_yaw + blend * target_yaw
+    s_yaw = -max_yaw_rate if s_yaw < -max_yaw_rate else max_yaw_rate if s_yaw > max_yaw_rate else s_yaw
+
+    # Integral terms
+    if abs(f_roll) > 0.05 or abs(target_roll) > 0.01:
+        i_roll += f_roll * dt
+        i_roll = -limit if i_roll < -limit else limit if i_roll > limit else i_roll
+    else:
+        i_roll *= decay
+
+    if abs(f_pitch) > 0.05 or abs(target_pitch) > 0.01:
+        i_pitch += f_pitch * dt
+        i_pitch = -limit if i_pitch < -limit else limit if i_pitch > limit else i_pitch
+    else:
+        i_pitch *= decay
+
+    if user_yaw_input or abs(f_gz) > 0.1:
+        i_yaw += f_gz * dt
+        i_yaw = -limit if i_yaw < -limit else limit if i_yaw > limit else i_yaw
+    else:
+        i_yaw *= decay
+
+    state[:] = (f_roll, f_pitch, f_yaw, f_gx, f_gy, f_gz,
+                s_roll, s_pitch, s_yaw, i_roll, i_pitch, i_yaw)
+
+    # PID calculations
+    roll_input = roll_p * f_roll + roll_d * f_gx + 0.3 * i_roll + s_roll
+    pitch_input = pitch_p * f_pitch + pitch_d * f_gy + 0.3 * i_pitch + s_pitch
+
+    if user_yaw_input:
+        yaw_input = s_yaw + yaw_d * f_gz
+    else:
+        yaw_input = -yaw_p * f_gz - 0.2 * i_yaw
+
+    roll_input = -12.0 if roll_input < -12.0 else 12.0 if roll_input > 12.0 else roll_input
+    pitch_input = -12.0 if pitch_input < -12.0 else 12.0 if pitch_input > 12.0 else pitch_input
+    yaw_input = -6.0 if yaw_input < -6.0 else 6.0 if yaw_input > 6.0 else yaw_input
+
+    # Altitude control
+    altitude_error = target_altitude - altitude + vertical_offset
+    altitude_error = -1.0 if altitude_error < -1.0 else 1.0 if altitude_error > 1.0 else altitude_error
+    base = vertical_thrust + vertical_p * altitude_error ** 3.0
+
+    # Motor mixing
+    fl = base - roll_input + pitch_input - yaw_input
+    fr = base + roll_input + pitch_input + yaw_input
+    rl = base - roll_input - pitch_input + yaw_input
+    rr = base + roll_input - pitch_input - yaw_input
+    return (
+        0.0 if fl < 0.0 else 600.0 if fl > 600.0 else fl,
+        0.0 if fr < 0.0 else 600.0 if fr > 600.0 else fr,
+        0.0 if rl < 0.0 else 600.0 if rl > 600.0 else rl,
+        0.0 if rr < 0.0 else 600.0 if rr > 600.0 else rr,
+    )
+
+
+step = njit(cache=True, fastmath=True)(_step_floats) if NUMBA_AVAILABLE else _step_floats
+
+
+def warmup(params):
+    """Compile the kernel before flight so the first control tick does not pay the JIT cost"""
+    scratch = new_state()
+    step(0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, False, 0.001, scratch, params)
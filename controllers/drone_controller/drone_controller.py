@@ -1,13 +1,16 @@
 from controller import Robot, Camera, Compass, GPS, Gyro, InertialUnit, Keyboard, LED, Motor
 import math
 import time
+import operator
 import json
 import socket
 import os
 import numpy as np
-import pandas as pd
 from threading import Thread
-from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Full, Empty
+
+import _pid_core
 
 try:
     import joblib
@@ -17,12 +20,20 @@ except ImportError:
     ML_AVAILABLE = False
     # print("⚠️ ML libraries not available")
 
-# Helper functions
-def sign(x):
-    return 1 if x > 0 else (-1 if x < 0 else 0)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
-def clamp(value, low, high):
-    return low if value < low else (high if value > high else value)
+# sendmsg() is unavailable on Windows
+HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
+
+# Model files live next to this controller
+CONTROLLER_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(CONTROLLER_DIR, 'orientation_model.pkl')
+SCALER_PATH = os.path.join(CONTROLLER_DIR, 'scaler.pkl')
+WEIGHTS_PATH = os.path.join(CONTROLLER_DIR, 'orientation_model.npz')
 
 # BALANCED PARAMETERS FOR STABLE FLIGHT
 MAX_ROLL_RATE = 0.3
@@ -32,6 +43,55 @@ MOVEMENT_SMOOTHING = 0.85
 STRAFE_POWER = 0.3
 FORWARD_POWER = 0.3
 YAW_POWER = 0.25
+ALTITUDE_STEP = 0.05
+
+NO_USER_INPUTS = bytes(8)
+
+# Keyboard actions: indices 0-2 address the [roll, pitch, yaw] target commands
+KEY_ROLL, KEY_PITCH, KEY_YAW, KEY_ALTITUDE, KEY_END = range(5)
+
+class TelemetryCodec:
+    """JSON encoder specialised for the fixed telemetry record built in DroneController.run().
+
+    The record layout is baked into one %-format template, so encoding is a single string
+    format call instead of a walk over the dict. Records that do not fit the layout (other
+    keys or list lengths, None or non-finite values) are encoded with json.dumps instead.
+    """
+    SCALAR_FIELDS = (
+        'simulation_time', 'altitude', 'filtered_roll', 'filtered_pitch', 'filtered_yaw',
+        'stability_index', 'ml_roll_error', 'ml_pitch_error', 'ml_yaw_error',
+        'gyro_x', 'gyro_y', 'gyro_z', 'target_altitude'
+    )
+    MOTOR_COUNT = 4
+    USER_INPUT_COUNT = 8
+
+    def __init__(self):
+        # %r of a float is its shortest round-trip repr, the same text json.dumps writes
+        fields = ['"%s":%%r' % name for name in self.SCALAR_FIELDS]
+        fields.append('"motor_velocities":[' + ','.join(['%r'] * self.MOTOR_COUNT) + ']')
+        fields.append('"total_thrust":%r')
+        fields.append('"user_inputs":[' + ','.join(['%d'] * self.USER_INPUT_COUNT) + ']')
+        self.template = '{' + ','.join(fields) + '}'
+        self.field_count = len(self.SCALAR_FIELDS) + 3
+        self._get_scalars = operator.itemgetter(*self.SCALAR_FIELDS)
+
+    def encode(self, data):
+        if len(data) == self.field_count:
+            try:
+                motors = data['motor_velocities']
+                user_inputs = data['user_inputs']
+                # Only plain ints belong in the %d slots; bools and floats would not print as json does
+                if len(user_inputs) == self.USER_INPUT_COUNT and all(type(v) is int for v in user_inputs):
+                    # float() also turns NumPy scalars into plain floats so %r prints bare numbers
+                    values = list(map(float, self._get_scalars(data)))
+                    values += map(float, motors)
+                    values.append(float(data['total_thrust']))
+                    values += user_inputs
+                    if math.isfinite(math.fsum(values)):
+                        return (self.template % tuple(values)).encode('utf-8')
+            except (KeyError, TypeError, ValueError, OverflowError):
+                pass  # Missing key, None or non-numeric value, wrong list length, or sum overflow
+        return json.dumps(data, separators=(',', ':')).encode('utf-8')
 
 class TCPSender:
     def __init__(self, host='localhost', port=8766):
@@ -39,7 +99,13 @@ class TCPSender:
         self.port = port
         self.socket = None
         self.connected = False
+        # Only used when orjson is missing; orjson is still faster than the specialised template
+        self.codec = TelemetryCodec()
+        # Telemetry is handed to a background thread so socket I/O never stalls the control loop
+        self.queue = Queue(maxsize=64)
         self.connect()
+        self.worker = Thread(target=self._worker, daemon=True)
+        self.worker.start()
     
     def connect(self):
         try:
@@ -47,73 +113,156 @@ class TCPSender:
                 self.socket.close()
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.connect((self.host, self.port))
+            # Small telemetry lines should go out immediately rather than wait on Nagle
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
             self.connected = True
             print("Connected to TCP server")
         except Exception as e:
             self.connected = False
             print(f"TCP connection error: {e}")
 
+    def _encode(self, data):
+        if ORJSON_AVAILABLE:
+            return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+        return self.codec.encode(data)
+
+    def _send_line(self, payload):
+        """Send payload plus the newline delimiter, gathering both in one syscall where supported"""
+        if HAS_SENDMSG:
+            sent = self.socket.sendmsg([payload, b'\n'])
+            if sent < len(payload) + 1:
+                self.socket.sendall((payload + b'\n')[sent:])
+        else:
+            self.socket.sendall(payload + b'\n')
+
+    def _worker(self):
+        while True:
+            data = self.queue.get()
+            if not self.connected:
+                self.connect()
+                if not self.connected:
+                    continue
+            
+            try:
+                self._send_line(self._encode(data))
+            except Exception as e:
+                print(f"TCP send error: {e}")
+                self.connected = False
+
     def send(self, data):
-        if not self.connected:
-            self.connect()
-        
+        """Queue data for the sender thread, dropping the oldest entry when full"""
         try:
-            message = json.dumps(data) + '\n'
-            self.socket.sendall(message.encode('utf-8'))
-        except Exception as e:
-            print(f"TCP send error: {e}")
-            self.connected = False
+            self.queue.put_nowait(data)
+        except Full:
+            try:
+                self.queue.get_nowait()
+            except Empty:
+                pass
+            self.queue.put_nowait(data)
 
 class MLOrientationPredictor:
     def __init__(self):
         self.model = None
         self.scaler = None
         self.model_loaded = False
+        self._center = None
+        self._W = None
+        self._b = None
         self.feature_names = [
             'gyro_x', 'gyro_y', 'gyro_z',
             'motor_fl_cmd', 'motor_fr_cmd', 'motor_rl_cmd', 'motor_rr_cmd',
             'total_thrust', 'stability_index'
         ]
+        # Reused every tick so predict() does not allocate a new feature row
+        self._feat_buf = np.empty((1, len(self.feature_names)), dtype=np.float64)
         self.load_model()
     
     def load_model(self):
+        if self._load_weights():
+            return
+        
         if not ML_AVAILABLE:
             print("⚠️ Cannot load ML model - libraries not available")
             return
             
         try:
-            controller_dir = os.path.dirname(os.path.abspath(__file__))
-            model_path = os.path.join(controller_dir, 'orientation_model.pkl')
-            scaler_path = os.path.join(controller_dir, 'scaler.pkl')
-            
-            if os.path.exists(model_path) and os.path.exists(scaler_path):
-                self.model = joblib.load(model_path)
-                self.scaler = joblib.load(scaler_path)
-                self.model_loaded = True
-                print("✓ ML model and scaler loaded successfully")
-            else:
-                print(f"❌ Model files not found at {model_path}")
+            # Memory-map stored arrays instead of copying them into the process
+            self.model = joblib.load(MODEL_PATH, mmap_mode='r')
+            self.scaler = joblib.load(SCALER_PATH, mmap_mode='r')
+            self._fuse_affine()
+            if self._W is not None:
+                # W/b hold their own copy of the weights, so the loaded objects can be released
+                self.model = None
+                self.scaler = None
+            self.model_loaded = True
+            print("✓ ML model and scaler loaded successfully")
                 
+        except FileNotFoundError as e:
+            print(f"❌ Model files not found: {e.filename}")
+            self.model_loaded = False
         except Exception as e:
             print(f"❌ Error loading ML model: {e}")
             self.model_loaded = False
 
+    def _load_weights(self):
+        """Load the fused W/b written by train_model.py, returning False if it is not available"""
+        try:
+            with np.load(WEIGHTS_PATH) as weights:
+                self._W = weights['W'].astype(np.float64)
+                self._b = weights['b'].astype(np.float64)
+            self._center = np.zeros(self._W.shape[0])
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"❌ Error loading ML weights: {e}")
+            return False
+        
+        self.model = None
+        self.scaler = None
+        self.model_loaded = True
+        print("✓ ML weights loaded successfully")
+        return True
+
+    def _fuse_affine(self):
+        """Fold StandardScaler + LinearRegression into y = (x - mean) @ W + b"""
+        self._center = None
+        self._W = None
+        self._b = None
+        coef = getattr(self.model, 'coef_', None)
+        intercept = getattr(self.model, 'intercept_', None)
+        mean = getattr(self.scaler, 'mean_', None)
+        scale = getattr(self.scaler, 'scale_', None)
+        if coef is None or intercept is None or mean is None or scale is None:
+            # Not a plain linear model - predict() falls back to the sklearn path
+            return
+        
+        # The mean is subtracted separately rather than folded into b: collinear features
+        # (total_thrust is the sum of the motors) can leave huge coefficients, and centering
+        # first keeps the cancellation as small as in the sklearn path
+        coef = np.atleast_2d(np.asarray(coef, dtype=np.float64))
+        self._center = np.array(mean, dtype=np.float64)
+        self._W = (coef / scale).T.astype(np.float64)
+        self._b = np.array(intercept, dtype=np.float64)
+
     def predict(self, gyro_values, motor_velocities, stability_index):
         if not self.model_loaded:
             return [0.0, 0.0, 0.0]
             
         try:
-            total_thrust = sum(abs(v) for v in motor_velocities)
+            fl, fr, rl, rr = motor_velocities
+            total_thrust = abs(fl) + abs(fr) + abs(rl) + abs(rr)
             
-            features = [
+            buf = self._feat_buf
+            buf[0, :] = (
                 gyro_values[0], gyro_values[1], gyro_values[2],
-                motor_velocities[0], motor_velocities[1], motor_velocities[2], motor_velocities[3],
-                total_thrust, stability_index
-            ]
+                fl, fr, rl, rr, total_thrust, stability_index
+            )
             
-            feature_df = pd.DataFrame([features], columns=self.feature_names)
-            scaled_features = self.scaler.transform(feature_df)
-            predictions = self.model.predict(scaled_features)
+            if self._W is not None:
+                predictions = (buf - self._center) @ self._W + self._b
+            else:
+                predictions = self.model.predict(self.scaler.transform(buf))
             
             return predictions[0].tolist()
             
@@ -159,6 +308,9 @@ class DroneController:
         # ML components
         self.ml_predictor = MLOrientationPredictor()
         self.tcp_sender = TCPSender()
+        # ML prediction runs here while robot.step() advances the simulation
+        self._ml_pool = ThreadPoolExecutor(max_workers=1)
+        self._pending_telemetry = None
         
         # TUNED PID PARAMETERS from working code
         self.k_vertical_thrust = 68.5
@@ -173,24 +325,53 @@ class DroneController:
         
         # Movement variables
         self.target_altitude = 1.0
-        self.smooth_roll_cmd = 0.0
-        self.smooth_pitch_cmd = 0.0
-        self.smooth_yaw_cmd = 0.0
+        
+        # Key code -> (action, value, user_inputs slot), covering both letter cases
+        self._key_handlers = {
+            Keyboard.UP: (KEY_PITCH, -FORWARD_POWER, 0),
+            Keyboard.DOWN: (KEY_PITCH, FORWARD_POWER, 1),
+            Keyboard.LEFT: (KEY_ROLL, -STRAFE_POWER, 2),
+            Keyboard.RIGHT: (KEY_ROLL, STRAFE_POWER, 3),
+            Keyboard.END: (KEY_END, 0.0, None),
+        }
+        for letter, handler in (('A', (KEY_YAW, YAW_POWER, 4)),
+                                ('D', (KEY_YAW, -YAW_POWER, 5)),
+                                ('W', (KEY_ALTITUDE, ALTITUDE_STEP, 6)),
+                                ('S', (KEY_ALTITUDE, -ALTITUDE_STEP, 7))):
+            self._key_handlers[ord(letter)] = handler
+            self._key_handlers[ord(letter.lower())] = handler
+        # Per-tick key flags, reset in place instead of allocating a new list
+        self._user_inputs = bytearray(8)
         
         # Filtering
         self.alpha = 0.9
-        self.filtered_roll = 0.0
-        self.filtered_pitch = 0.0
-        self.filtered_yaw = 0.0
-        self.filtered_gyro = [0.0, 0.0, 0.0]
         
         # PID integral terms
-        self.roll_integral = 0.0
-        self.pitch_integral = 0.0
-        self.yaw_integral = 0.0
         self.integral_limit = 0.5
         self.integral_decay = 0.98
         
+        # Flight state updated in place by the PID kernel (an array under Numba, a list otherwise)
+        self._state = _pid_core.new_state()
+        
+        self._params = _pid_core.new_params()
+        self._params[_pid_core.P_ALPHA] = self.alpha
+        self._params[_pid_core.P_SMOOTHING] = MOVEMENT_SMOOTHING
+        self._params[_pid_core.P_VERTICAL_THRUST] = self.k_vertical_thrust
+        self._params[_pid_core.P_VERTICAL_OFFSET] = self.k_vertical_offset
+        self._params[_pid_core.P_VERTICAL_P] = self.k_vertical_p
+        self._params[_pid_core.P_ROLL_P] = self.k_roll_p
+        self._params[_pid_core.P_PITCH_P] = self.k_pitch_p
+        self._params[_pid_core.P_YAW_P] = self.k_yaw_p
+        self._params[_pid_core.P_ROLL_D] = self.k_roll_d
+        self._params[_pid_core.P_PITCH_D] = self.k_pitch_d
+        self._params[_pid_core.P_YAW_D] = self.k_yaw_d
+        self._params[_pid_core.P_MAX_ROLL_RATE] = MAX_ROLL_RATE
+        self._params[_pid_core.P_MAX_PITCH_RATE] = MAX_PITCH_RATE
+        self._params[_pid_core.P_MAX_YAW_RATE] = MAX_YAW_RATE
+        self._params[_pid_core.P_INTEGRAL_LIMIT] = self.integral_limit
+        self._params[_pid_core.P_INTEGRAL_DECAY] = self.integral_decay
+        _pid_core.warmup(self._params)
+        
         # Wait for initialization
         print("Waiting for sensor initialization...")
         while self.robot.step(self.timestep) != -1:
@@ -215,56 +396,36 @@ class DroneController:
         
     def handle_keyboard_input(self):
         """Handle keyboard input for drone control - using working logic"""
-        user_inputs = [0] * 8
-        target_roll_cmd = 0.0
-        target_pitch_cmd = 0.0
-        target_yaw_cmd = 0.0
+        user_inputs = self._user_inputs
+        user_inputs[:] = NO_USER_INPUTS
+        targets = [0.0, 0.0, 0.0]
         user_yaw_input = False
+        key_handlers = self._key_handlers
         
         key = self.keyboard.getKey()
         
         while key > 0:
-            if key == Keyboard.UP:
-                target_pitch_cmd = -FORWARD_POWER
-                user_inputs[0] = 1
-            elif key == Keyboard.DOWN:
-                target_pitch_cmd = FORWARD_POWER
-                user_inputs[1] = 1
-            elif key == Keyboard.LEFT:
-                target_roll_cmd = -STRAFE_POWER
-                user_inputs[2] = 1
-            elif key == Keyboard.RIGHT:
-                target_roll_cmd = STRAFE_POWER
-                user_inputs[3] = 1
-            elif key in (ord('A'), ord('a')):
-                target_yaw_cmd = YAW_POWER
-                user_inputs[4] = 1
-                user_yaw_input = True
-            elif key in (ord('D'), ord('d')):
-                target_yaw_cmd = -YAW_POWER
-                user_inputs[5] = 1
-                user_yaw_input = True
-            elif key in (ord('W'), ord('w')):
-                self.target_altitude += 0.05
-                user_inputs[6] = 1
-                print(f"Target altitude: {self.target_altitude:.2f} m")
-            elif key in (ord('S'), ord('s')):
-                self.target_altitude -= 0.05
-                self.target_altitude = max(self.target_altitude, 0.1)
-                user_inputs[7] = 1
-                print(f"Target altitude: {self.target_altitude:.2f} m")
-            elif key == Keyboard.END:
-                return None, user_inputs  # Signal to end
+            handler = key_handlers.get(key)
+            if handler is not None:
+                action, value, slot = handler
+                if action == KEY_END:
+                    return None, user_inputs  # Signal to end
+                
+                user_inputs[slot] = 1
+                if action == KEY_ALTITUDE:
+                    self.target_altitude = max(self.target_altitude + value, 0.1)
+                    print(f"Target altitude: {self.target_altitude:.2f} m")
+                else:
+                    targets[action] = value
+                    if action == KEY_YAW:
+                        user_yaw_input = True
                 
             key = self.keyboard.getKey()
         
-        return (target_roll_cmd, target_pitch_cmd, target_yaw_cmd, user_yaw_input), user_inputs
+        return (targets[0], targets[1], targets[2], user_yaw_input), user_inputs
     
-    def update_motor_velocities(self, imu_values, gyro_values, altitude, dt):
+    def update_motor_velocities(self, imu_values, gyro_values, altitude, dt, sim_time):
         """Update motor velocities using working flight control logic"""
-        roll, pitch, yaw = imu_values
-        roll_velocity, pitch_velocity, yaw_velocity = gyro_values
-        
         # Handle keyboard input
         input_result = self.handle_keyboard_input()
         if input_result[0] is None:  # END key pressed
@@ -272,82 +433,23 @@ class DroneController:
             
         (target_roll_cmd, target_pitch_cmd, target_yaw_cmd, user_yaw_input), user_inputs = input_result
         
-        # Filtering
-        self.filtered_roll = self.alpha * self.filtered_roll + (1 - self.alpha) * roll
-        self.filtered_pitch = self.alpha * self.filtered_pitch + (1 - self.alpha) * pitch
-        self.filtered_yaw = self.alpha * self.filtered_yaw + (1 - self.alpha) * yaw
-        
-        for i in range(3):
-            self.filtered_gyro[i] = self.alpha * self.filtered_gyro[i] + (1 - self.alpha) * gyro_values[i]
+        motor_commands = _pid_core.step(
+            imu_values[0], imu_values[1], imu_values[2],
+            gyro_values[0], gyro_values[1], gyro_values[2],
+            altitude, self.target_altitude,
+            target_roll_cmd, target_pitch_cmd, target_yaw_cmd, user_yaw_input,
+            dt, self._state, self._params
+        )
+        filt_gyro = self._state[_pid_core.FILT_GYRO]
         
         # LED control
-        led_state = int(self.robot.getTime()) % 2
+        led_state = int(sim_time) % 2
         self.front_left_led.set(led_state)
         self.front_right_led.set(1 if not led_state else 0)
         
         # Camera stabilization
-        self.camera_roll_motor.setPosition(-0.03 * self.filtered_gyro[0])
-        self.camera_pitch_motor.setPosition(-0.03 * self.filtered_gyro[1])
-        
-        # Movement smoothing
-        self.smooth_roll_cmd = MOVEMENT_SMOOTHING * self.smooth_roll_cmd + (1.0 - MOVEMENT_SMOOTHING) * target_roll_cmd
-        self.smooth_pitch_cmd = MOVEMENT_SMOOTHING * self.smooth_pitch_cmd + (1.0 - MOVEMENT_SMOOTHING) * target_pitch_cmd
-        self.smooth_yaw_cmd = MOVEMENT_SMOOTHING * self.smooth_yaw_cmd + (1.0 - MOVEMENT_SMOOTHING) * target_yaw_cmd
-        
-        # Rate limiting
-        self.smooth_roll_cmd = clamp(self.smooth_roll_cmd, -MAX_ROLL_RATE, MAX_ROLL_RATE)
-        self.smooth_pitch_cmd = clamp(self.smooth_pitch_cmd, -MAX_PITCH_RATE, MAX_PITCH_RATE)
-        self.smooth_yaw_cmd = clamp(self.smooth_yaw_cmd, -MAX_YAW_RATE, MAX_YAW_RATE)
-        
-        # PID control
-        roll_error = self.filtered_roll
-        pitch_error = self.filtered_pitch
-        
-        # Integral terms
-        if abs(roll_error) > 0.05 or abs(target_roll_cmd) > 0.01:
-            self.roll_integral = clamp(self.roll_integral + roll_error * dt, -self.integral_limit, self.integral_limit)
-        else:
-            self.roll_integral *= self.integral_decay
-            
-        if abs(pitch_error) > 0.05 or abs(target_pitch_cmd) > 0.01:
-            self.pitch_integral = clamp(self.pitch_integral + pitch_error * dt, -self.integral_limit, self.integral_limit)
-        else:
-            self.pitch_integral *= self.integral_decay
-        
-        if user_yaw_input or abs(self.filtered_gyro[2]) > 0.1:
-            self.yaw_integral = clamp(self.yaw_integral + self.filtered_gyro[2] * dt, -self.integral_limit, self.integral_limit)
-        else:
-            self.yaw_integral *= self.integral_decay
-        
-        # PID calculations
-        roll_input = (self.k_roll_p * roll_error + self.k_roll_d * self.filtered_gyro[0] + 0.3 * self.roll_integral + self.smooth_roll_cmd)
-        pitch_input = (self.k_pitch_p * pitch_error + self.k_pitch_d * self.filtered_gyro[1] + 0.3 * self.pitch_integral + self.smooth_pitch_cmd)
-        
-        if user_yaw_input:
-            yaw_input = self.smooth_yaw_cmd + self.k_yaw_d * self.filtered_gyro[2]
-        else:
-            yaw_input = -self.k_yaw_p * self.filtered_gyro[2] - 0.2 * self.yaw_integral
-        
-        # Clamp control inputs
-        roll_input = clamp(roll_input, -12.0, 12.0)
-        pitch_input = clamp(pitch_input, -12.0, 12.0)
-        yaw_input = clamp(yaw_input, -6.0, 6.0)
-        
-        # Altitude control
-        altitude_error = self.target_altitude - altitude + self.k_vertical_offset
-        clamped_altitude_error = clamp(altitude_error, -1.0, 1.0)
-        vertical_input = self.k_vertical_p * (clamped_altitude_error ** 3.0)
-        
-        # Motor mixing
-        front_left_motor_cmd = self.k_vertical_thrust + vertical_input - roll_input + pitch_input - yaw_input
-        front_right_motor_cmd = self.k_vertical_thrust + vertical_input + roll_input + pitch_input + yaw_input
-        rear_left_motor_cmd = self.k_vertical_thrust + vertical_input - roll_input - pitch_input + yaw_input
-        rear_right_motor_cmd = self.k_vertical_thrust + vertical_input + roll_input - pitch_input - yaw_input
-        
-        # Clamp motor commands
-        motor_commands = [front_left_motor_cmd, front_right_motor_cmd, rear_left_motor_cmd, rear_right_motor_cmd]
-        for i in range(4):
-            motor_commands[i] = clamp(motor_commands[i], 0.0, 600.0)
+        self.camera_roll_motor.setPosition(-0.03 * filt_gyro[0])
+        self.camera_pitch_motor.setPosition(-0.03 * filt_gyro[1])
         
         # Apply motor commands with correct rotation directions
         self.motors[0].setVelocity(motor_commands[0])
@@ -357,24 +459,43 @@ class DroneController:
         
         return motor_commands, user_inputs
         
+    def _flush_telemetry(self):
+        """Complete and send the telemetry queued on the previous step once its ML prediction is ready"""
+        future, data, debug = self._pending_telemetry
+        self._pending_telemetry = None
+        
+        ml_errors = future.result()
+        data["ml_roll_error"] = ml_errors[0]
+        data["ml_pitch_error"] = ml_errors[1]
+        data["ml_yaw_error"] = ml_errors[2]
+        self.tcp_sender.send(data)
+        
+        if debug:  # Debug info every 100 steps
+            ml_info = f" | ML: Roll={ml_errors[0]:.3f}, Pitch={ml_errors[1]:.3f}" if self.ml_predictor.model_loaded else ""
+            print(f"📊 Time: {data['simulation_time']:.1f}s | Alt: {data['altitude']:.2f}m | Roll: {data['filtered_roll'] * 57.3:.1f}° | Pitch: {data['filtered_pitch'] * 57.3:.1f}°{ml_info}")
+        
     def run(self):
         step_counter = 0
+        dt = self.timestep / 1000.0
         print("Starting drone controller...")
         
         while self.robot.step(self.timestep) != -1:
             try:
+                # The previous step's prediction overlapped robot.step(), so its telemetry can go out now
+                if self._pending_telemetry is not None:
+                    self._flush_telemetry()
+                
+                # Read every Webots getter once per step and pass the values down
                 sim_time = self.robot.getTime()
-                dt = self.timestep / 1000.0
                 
                 # Sensor readings
                 imu_values = self.imu.getRollPitchYaw()
-                roll, pitch, yaw = imu_values
                 gyro_values = self.gyro.getValues()
                 gps_values = self.gps.getValues()
                 altitude = gps_values[2]
                 
                 # Update motor control
-                motor_result = self.update_motor_velocities(imu_values, gyro_values, altitude, dt)
+                motor_result = self.update_motor_velocities(imu_values, gyro_values, altitude, dt, sim_time)
                 if motor_result[0] is None:  # END key pressed
                     break
                     
@@ -382,36 +503,37 @@ class DroneController:
                 
                 # Calculate metrics
                 total_thrust = sum(motor_velocities)
-                stability_index = clamp(1.0 - ((abs(self.filtered_roll) + abs(self.filtered_pitch)) * 0.5), 0.0, 1.0)
-                
-                # ML predictions
-                ml_errors = self.ml_predictor.predict(self.filtered_gyro, motor_velocities, stability_index)
+                filt = self._state[_pid_core.FILT]
+                filt_gyro = self._state[_pid_core.FILT_GYRO]
+                stability_index = min(max(1.0 - ((abs(filt[0]) + abs(filt[1])) * 0.5), 0.0), 1.0)
                 
                 # Send data every 10 steps to reduce overhead
                 if step_counter % 10 == 0:
+                    # ML predictions are only consumed here, so run them at the same cadence.
+                    # The gyro values are copied since the worker runs while the next step updates the state.
+                    future = self._ml_pool.submit(
+                        self.ml_predictor.predict, tuple(filt_gyro), motor_velocities, stability_index
+                    )
+                    
                     data = {
                         "simulation_time": sim_time,
                         "altitude": altitude,
-                        "filtered_roll": self.filtered_roll,
-                        "filtered_pitch": self.filtered_pitch,
-                        "filtered_yaw": self.filtered_yaw,
+                        "filtered_roll": filt[0],
+                        "filtered_pitch": filt[1],
+                        "filtered_yaw": filt[2],
                         "stability_index": stability_index,
-                        "ml_roll_error": ml_errors[0],
-                        "ml_pitch_error": ml_errors[1],
-                        "ml_yaw_error": ml_errors[2],
-                        "gyro_x": self.filtered_gyro[0],
-                        "gyro_y": self.filtered_gyro[1],
-                        "gyro_z": self.filtered_gyro[2],
+                        "ml_roll_error": None,  # Filled in by _flush_telemetry
+                        "ml_pitch_error": None,
+                        "ml_yaw_error": None,
+                        "gyro_x": filt_gyro[0],
+                        "gyro_y": filt_gyro[1],
+                        "gyro_z": filt_gyro[2],
                         "target_altitude": self.target_altitude,
-                        "motor_velocities": motor_velocities,
+                        "motor_velocities": list(motor_velocities),
                         "total_thrust": total_thrust,
-                        "user_inputs": user_inputs
+                        "user_inputs": list(user_inputs)
                     }
-                    self.tcp_sender.send(data)
-                    
-                    if step_counter % 100 == 0:  # Debug info every 100 steps
-                        ml_info = f" | ML: Roll={ml_errors[0]:.3f}, Pitch={ml_errors[1]:.3f}" if self.ml_predictor.model_loaded else ""
-                        print(f"📊 Time: {sim_time:.1f}s | Alt: {altitude:.2f}m | Roll: {self.filtered_roll * 57.3:.1f}° | Pitch: {self.filtered_pitch * 57.3:.1f}°{ml_info}")
+                    self._pending_telemetry = (future, data, step_counter % 100 == 0)
                 
                 step_counter += 1
                 
@@ -419,7 +541,15 @@ class DroneController:
                 print(f"Error in main loop: {e}")
                 time.sleep(0.1)
         
+        # Send the last step's telemetry instead of dropping it with the worker
+        if self._pending_telemetry is not None:
+            try:
+                self._flush_telemetry()
+            except Exception as e:
+                print(f"Error sending final telemetry: {e}")
+        
         # Stop all motors when ending
+        self._ml_pool.shutdown(wait=False)
         for motor in self.motors:
             motor.setVelocity(0.0)
         print("🛑 Drone controller stopped")
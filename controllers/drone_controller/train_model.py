@@ -1,36 +1,42 @@
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import StandardScaler
-import joblib
-
-# Load the dataset
-data = pd.read_csv("./libraries/drone_flight_data_stable.csv")
-
-# Compute orientation errors (assuming command columns exist or are zero if not provided)
-data['roll_error'] = data['filtered_roll'] - data.get('roll_command', 0)
-data['pitch_error'] = data['filtered_pitch'] - data.get('pitch_command', 0)
-data['yaw_error'] = data['filtered_yaw'] - data.get('yaw_command', 0)
 
 # Select features and targets
 features = ['gyro_x', 'gyro_y', 'gyro_z', 'motor_fl_cmd', 'motor_fr_cmd', 'motor_rl_cmd', 'motor_rr_cmd', 'total_thrust', 'stability_index']
-X = data[features].fillna(0)  # Handle missing values
-y = data[['roll_error', 'pitch_error', 'yaw_error']]
-
-# Scale the features
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
+orientation = ['filtered_roll', 'filtered_pitch', 'filtered_yaw']
+commands = ['roll_command', 'pitch_command', 'yaw_command']
+needed = set(features + orientation + commands)
+
+# Load only the columns used for training. Keep float64: total_thrust is the sum of the
+# motor commands, so the fit is ill-conditioned and float32 inputs visibly shift it
+data = pd.read_csv("./libraries/drone_flight_data_stable.csv", usecols=lambda c: c in needed, dtype=np.float64)
+data = data.fillna(0)  # Handle missing values
+
+# Compute orientation errors (command columns are treated as zero if not provided)
+X = data[features].to_numpy()
+y = data[orientation].to_numpy(copy=True)
+for i, column in enumerate(commands):
+    if column in data:
+        y[:, i] -= data[column].to_numpy()
+
+# Standardize the features (for conditioning only - folded back into W/b below)
+mean = X.mean(axis=0, dtype=np.float64)
+scale = X.std(axis=0, dtype=np.float64)
+scale[scale == 0] = 1.0
+X_scaled = (X - mean) / scale
 
 # Split the data
 X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
 
-# Train a Linear Regression model
-model = LinearRegression()
-model.fit(X_train, y_train)
+# Fit the linear model in closed form, with a bias column for the intercept
+A = np.hstack([X_train, np.ones((len(X_train), 1))])
+solution, _, _, _ = np.linalg.lstsq(A, y_train, rcond=None)
+coef, intercept = solution[:-1].T, solution[-1]
 
-# Save the model and scaler
-joblib.dump(model, 'orientation_model.pkl')
-joblib.dump(scaler, 'scaler.pkl')
+# Fold the scaling into one affine map y = x @ W + b and save only that
+W = (coef / scale).T
+b = intercept - (mean / scale) @ coef.T
+np.savez('orientation_model.npz', W=W.astype(np.float32), b=b.astype(np.float32))
 
-print("Model and scaler saved as orientation_model.pkl and scaler.pkl")
\ No newline at end of file
+print("Model weights saved as orientation_model.npz")
@@ -1,5 +1,6 @@
 import serial
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import re
 
@@ -11,22 +12,26 @@ THINGSPEAK_URL = 'https://api.thingspeak.com/update'
 SERIAL_PORT = 'COM5'  # Change this to match your Arduino port
 BAUD_RATE = 9600
 
+# All five fields in the order the Arduino prints them, parsed in a single scan
+SERIAL_LINE_RE = re.compile(
+    r'Pitch:\s*(?P<pitch>[-+]?\d*\.?\d+)'
+    r'.*?Roll:\s*(?P<roll>[-+]?\d*\.?\d+)'
+    r'.*?Throttle L:\s*(?P<throttle_l>\d+)'
+    r'.*?Throttle R:\s*(?P<throttle_r>\d+)'
+    r'.*?Current:\s*(?P<current>[-+]?\d*\.?\d+)'
+)
+
 def parse_serial_line(line):
     """Parse the serial line using regex for more robust extraction"""
     try:
-        # Use regex to extract values more reliably
-        pitch_match = re.search(r'Pitch:\s*([-+]?\d*\.?\d+)', line)
-        roll_match = re.search(r'Roll:\s*([-+]?\d*\.?\d+)', line)
-        throttle_l_match = re.search(r'Throttle L:\s*(\d+)', line)
-        throttle_r_match = re.search(r'Throttle R:\s*(\d+)', line)
-        current_match = re.search(r'Current:\s*([-+]?\d*\.?\d+)', line)
+        match = SERIAL_LINE_RE.search(line)
         
-        if all([pitch_match, roll_match, throttle_l_match, throttle_r_match, current_match]):
-            pitch = float(pitch_match.group(1))
-            roll = float(roll_match.group(1))
-            throttleL = int(throttle_l_match.group(1))
-            throttleR = int(throttle_r_match.group(1))
-            current = float(current_match.group(1))
+        if match:
+            pitch = float(match['pitch'])
+            roll = float(match['roll'])
+            throttleL = int(match['throttle_l'])
+            throttleR = int(match['throttle_r'])
+            current = float(match['current'])
             
             return pitch, roll, throttleL, throttleR, current
         else:
@@ -45,6 +50,10 @@ except serial.SerialException as e:
     print(f"❌ Failed to connect to serial port: {e}")
     exit(1)
 
+# Reuse one keep-alive connection so each upload skips the TCP + TLS handshake
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=2))
+
 try:
     while True:
         try:
@@ -71,7 +80,7 @@ try:
                         }
                         
                         try:
-                            response = requests.post(THINGSPEAK_URL, data=payload, timeout=10)
+                            response = session.post(THINGSPEAK_URL, data=payload, timeout=10)
                             if response.status_code == 200:
                                 print("✅ ThingSpeak Upload Success:", response.status_code)
                             else:
@@ -94,6 +103,7 @@ except KeyboardInterrupt:
 except Exception as e:
     print(f"❌ Fatal error: {e}")
 finally:
+    session.close()
     if 'ser' in locals() and ser.is_open:
         ser.close()
         print("🔌 Serial connection closed")
\ No newline at end of file
@@ -2,10 +2,29 @@ import asyncio
 import websockets
 import json
 import logging
-import socketserver
-import threading
-import queue
+import os
+import socket
 import time
+from websockets.frames import Frame, Opcode
+from websockets.protocol import State
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import simdjson
+    SIMDJSON_AVAILABLE = True
+except ImportError:
+    SIMDJSON_AVAILABLE = False
+
+try:
+    import uvloop  # Not available on Windows
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
 
 # Configure logging
 logging.basicConfig(
@@ -14,57 +33,190 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-class TCPRequestHandler(socketserver.BaseRequestHandler):
-    def handle(self):
-        client_address = self.client_address[0]
-        logger.info(f"TCP client connected from {client_address}")
+# Upper bound on one client's send so a stuck peer cannot hold up the broadcast
+SEND_TIMEOUT = 1.0
+
+# A broadcast frame carries up to BATCH_MAX queued payloads joined with newlines (JSON lines),
+# stopping early once it reaches BATCH_MAX_BYTES. Clients split each frame on '\n'.
+BATCH_MAX = 64
+BATCH_MAX_BYTES = 64 * 1024
+
+# Local consumers can skip the loopback TCP stack by connecting over a Unix domain socket
+# (websockets.unix_connect(UNIX_SOCKET_PATH)); browsers keep using ws://localhost:8765
+UNIX_SOCKET_PATH = '/tmp/drone.sock'
+UNIX_SOCKET_AVAILABLE = os.name != 'nt'
+
+# Stale telemetry is worse than missing telemetry: once more than QUEUE_HIGH_WATERMARK payloads are
+# waiting, the oldest are dropped until only QUEUE_LOW_WATERMARK remain
+QUEUE_HIGH_WATERMARK = 256
+QUEUE_LOW_WATERMARK = 32
+DROP_LOG_INTERVAL = 10.0  # Seconds between drop-count log lines
+
+# Broadcasts between explicit yields to the event loop while the queue stays non-empty
+YIELD_EVERY = 256
+
+# Longest telemetry line accepted from the controller; longer lines are discarded
+MAX_LINE_BYTES = 65536
+
+# Kernel socket buffers big enough to absorb a telemetry burst (the kernel may cap them at
+# net.core.rmem_max / wmem_max)
+TCP_RCVBUF_SIZE = 4 * 1024 * 1024
+WS_SNDBUF_SIZE = 4 * 1024 * 1024
+
+def set_buffer_size(sock, option, size, name):
+    """Set a socket buffer size and log what the kernel actually granted"""
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, option, size)
+        granted = sock.getsockopt(socket.SOL_SOCKET, option)
+    except OSError as e:
+        logger.warning("Could not set %s: %s", name, e)
+        return
+    logger.info("%s set to %d bytes (requested %d)", name, granted, size)
+
+def set_nodelay(sock):
+    """Disable Nagle so small telemetry messages go out (and are read) without coalescing delays"""
+    if sock is None:
+        return
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError as e:
+        logger.debug("Could not set TCP_NODELAY: %s", e)
+
+def json_loads(data):
+    """Parse JSON from bytes or str, using orjson when it is installed"""
+    return orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+
+def json_dumps(data):
+    """Serialize to a JSON text string, using orjson when it is installed"""
+    return orjson.dumps(data).decode('utf-8') if ORJSON_AVAILABLE else json.dumps(data)
+
+# Reused for every lookup; ingest runs on the event loop thread only, so one parser is enough
+simdjson_parser = simdjson.Parser() if SIMDJSON_AVAILABLE else None
+
+def read_simulation_time(payload):
+    """Get simulation_time from a telemetry line, without building the whole dict when simdjson is installed"""
+    if SIMDJSON_AVAILABLE:
+        # The document must not outlive this call: the parser refuses to parse again while it is referenced
+        return simdjson_parser.parse(payload).get('simulation_time', 'N/A')
+    return json_loads(payload).get('simulation_time', 'N/A')
+
+class WebSocketServer:
+    def __init__(self):
+        # Immutable snapshot, replaced on connect/disconnect, so a broadcast can iterate it without copying
+        self.clients = ()
+        self.closing_tasks = set()  # Keeps references to background close() calls
+        self.server = None
+        self.unix_server = None
+        self.tcp_server = None
+        self.tcp_clients = {}  # Handler task -> stream writer, so shutdown can close connections first
+        self.running = False
+        self.broadcast_task = None
+        self.queue = None
+        self.dropped = 0
+        self.dropped_logged = 0
+        self.last_drop_log = 0.0
+
+    def add_client(self, websocket):
+        self.clients = (*self.clients, websocket)
+
+    def remove_client(self, websocket):
+        if websocket in self.clients:
+            self.clients = tuple(client for client in self.clients if client is not websocket)
+
+    def count_dropped(self, count):
+        self.dropped += count
+        now = time.monotonic()
+        if now - self.last_drop_log >= DROP_LOG_INTERVAL:
+            logger.warning("Broadcast backlog over %d payloads, dropped %d stale payloads (total dropped: %d)",
+                           QUEUE_HIGH_WATERMARK, self.dropped - self.dropped_logged, self.dropped)
+            self.dropped_logged = self.dropped
+            self.last_drop_log = now
+
+    def enqueue_payload(self, payload):
+        """Queue a payload for broadcast, shedding the oldest ones when the backlog passes the high watermark"""
+        queue = self.queue
+        if queue.qsize() >= QUEUE_HIGH_WATERMARK:
+            stale = queue.qsize() - QUEUE_LOW_WATERMARK
+            for _ in range(stale):
+                queue.get_nowait()
+            self.count_dropped(stale)
+        queue.put_nowait(payload)
+
+    async def handle_tcp_client(self, reader, writer):
+        """Read newline-delimited telemetry from the Webots controller and queue it for broadcast"""
+        client_address = writer.get_extra_info('peername')[0]
+        logger.info("TCP client connected from %s", client_address)
+        task = asyncio.current_task()
+        self.tcp_clients[task] = writer
+        sock = writer.get_extra_info('socket')
+        set_nodelay(sock)
         
-        buffer = ""
+        discarding = False  # Set while skipping the rest of an oversized line
         try:
             while True:
-                data = self.request.recv(4096)
-                if not data:
-                    break
+                try:
+                    line = await reader.readuntil(b'\n')
+                except asyncio.IncompleteReadError:
+                    break  # Connection closed, possibly mid-line
+                except asyncio.LimitOverrunError as e:
+                    if not discarding:
+                        logger.warning("Discarding TCP message longer than %d bytes", MAX_LINE_BYTES)
+                        discarding = True
+                    await reader.readexactly(e.consumed)
+                    continue
                 
-                buffer += data.decode('utf-8')
+                if discarding:
+                    discarding = False
+                    continue
                 
-                # Process complete messages (separated by newlines)
-                while '\n' in buffer:
-                    message, buffer = buffer.split('\n', 1)
-                    message = message.strip()
-                    
-                    if message:
-                        try:
-                            json_data = json.loads(message)
-                            data_queue.put(json_data)
-                            logger.debug(f"Received data: simulation_time={json_data.get('simulation_time', 'N/A')}")
-                        except json.JSONDecodeError as e:
-                            logger.warning(f"Invalid JSON received: {e}")
-                        except Exception as e:
-                            logger.error(f"Error processing message: {e}")
-                            
+                message = line.strip()
+                if message:
+                    try:
+                        # Forward the raw line; only a cheap shape check is done here and
+                        # the payload is parsed just for debug logging
+                        if not message.startswith(b'{'):
+                            logger.warning("Invalid JSON received: expected an object, got %r", message[:20])
+                            continue
+                        self.enqueue_payload(message)
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("Received data: simulation_time=%s", read_simulation_time(message))
+                    except ValueError as e:  # JSONDecodeError from json/orjson, ValueError from simdjson
+                        logger.warning("Invalid JSON received: %s", e)
+                    except Exception as e:
+                        logger.error("Error processing message: %s", e)
+                        
         except ConnectionResetError:
-            logger.info(f"TCP client {client_address} disconnected")
+            logger.info("TCP client %s disconnected", client_address)
         except Exception as e:
-            logger.error(f"TCP handler error: {e}")
+            logger.error("TCP handler error: %s", e)
         finally:
-            logger.info(f"TCP client {client_address} connection closed")
+            self.tcp_clients.pop(task, None)
+            writer.close()
+            logger.info("TCP client %s connection closed", client_address)
 
-class WebSocketServer:
-    def __init__(self):
-        self.clients = set()
-        self.server = None
-        self.running = False
-        self.broadcast_task = None
+    async def stop_tcp(self):
+        """Close the ingest listener and client connections so each handler exits through end-of-stream"""
+        if self.tcp_server:
+            self.tcp_server.close()
+        for writer in self.tcp_clients.values():
+            writer.close()
+        if self.tcp_clients:
+            await asyncio.wait(list(self.tcp_clients), timeout=1.0)
 
     async def register(self, websocket):  # Fixed: removed 'path' parameter
         client_address = websocket.remote_address
-        self.clients.add(websocket)
-        logger.info(f"WebSocket client connected from {client_address[0]}:{client_address[1]} (total: {len(self.clients)})")
+        if client_address:
+            client_label = f"{client_address[0]}:{client_address[1]}"
+            # asyncio normally sets this on TCP transports already; make sure of it
+            set_nodelay(websocket.transport.get_extra_info('socket'))
+        else:
+            client_label = "unix socket"  # Unix socket peers have no address
+        self.add_client(websocket)
+        logger.info("WebSocket client connected from %s (total: %d)", client_label, len(self.clients))
         
         try:
             # Send initial connection confirmation
-            await websocket.send(json.dumps({
+            await websocket.send(json_dumps({
                 "type": "connection_status",
                 "status": "connected",
                 "message": "Connected to drone data stream"
@@ -73,66 +225,137 @@ class WebSocketServer:
             # Keep connection alive
             await websocket.wait_closed()
         except websockets.exceptions.ConnectionClosed:
-            logger.info(f"WebSocket client {client_address[0]}:{client_address[1]} disconnected normally")
+            logger.info("WebSocket client %s disconnected normally", client_label)
         except Exception as e:
-            logger.error(f"WebSocket client error: {e}")
+            logger.error("WebSocket client error: %s", e)
         finally:
-            self.clients.discard(websocket)
-            logger.info(f"WebSocket client {client_address[0]}:{client_address[1]} removed (remaining: {len(self.clients)})")
+            self.remove_client(websocket)
+            logger.info("WebSocket client %s removed (remaining: %d)", client_label, len(self.clients))
+
+    def write_frame(self, websocket, frame, message):
+        """Write an already serialized frame to one client.
+
+        Returns an awaitable when the broadcast has to wait on this client (its write buffer is
+        over the flow-control limit, or it goes through send()), otherwise None.
+        """
+        protocol = getattr(websocket, 'protocol', None)
+        transport = getattr(websocket, 'transport', None)
+        drain = getattr(websocket, 'drain', None)
+        if protocol is None or transport is None or drain is None or not hasattr(websocket, 'paused'):
+            # transport/paused/drain are internals of the asyncio Connection (websockets >= 14).
+            # Legacy connections, or a release that drops them, use the public send() instead
+            return websocket.send(message)
+        if protocol.state is not State.OPEN:
+            return None  # Closing; register() drops it from the client set
+        
+        transport.write(frame)
+        return drain() if websocket.paused else None
 
     async def broadcast_data(self):
         """Continuously broadcast data from queue to all connected clients"""
         logger.info("Starting data broadcast task")
+        broadcasts = 0
         
         while self.running:
             try:
-                # Check for new data
-                if not data_queue.empty():
-                    data = data_queue.get_nowait()
-                    message = json.dumps(data)
+                # Wakes as soon as a TCP client queues a payload
+                payload = await self.queue.get()
+                
+                # Take whatever else is already waiting so a burst goes out as one frame
+                batch = [payload]
+                batch_bytes = len(payload)
+                while len(batch) < BATCH_MAX and batch_bytes < BATCH_MAX_BYTES and not self.queue.empty():
+                    payload = self.queue.get_nowait()
+                    batch.append(payload)
+                    batch_bytes += len(payload) + 1
+                
+                # Send to all connected clients
+                if self.clients:
+                    # Payloads arrive as already-serialized JSON bytes. Server frames are not masked,
+                    # so the frame is built once and the same bytes are written to every client.
+                    # Binary frames spare clients the UTF-8 validation text frames require.
+                    message = b'\n'.join(batch)
+                    frame = Frame(Opcode.BINARY, message).serialize(mask=False)
                     
-                    # Send to all connected clients
-                    if self.clients:
-                        disconnected_clients = set()
-                        
-                        for websocket in self.clients.copy():
-                            try:
-                                await websocket.send(message)
-                            except websockets.exceptions.ConnectionClosed:
-                                disconnected_clients.add(websocket)
-                            except Exception as e:
-                                logger.warning(f"Error sending to client: {e}")
-                                disconnected_clients.add(websocket)
-                        
-                        # Remove disconnected clients
-                        for websocket in disconnected_clients:
-                            self.clients.discard(websocket)
+                    # Writes complete without suspending; only clients that need waiting on are awaited,
+                    # together in a single gather
+                    waiting = []
+                    for websocket in self.clients:
+                        pending = self.write_frame(websocket, frame, message)
+                        if pending is not None:
+                            waiting.append((websocket, pending))
+                    
+                    if waiting:
+                        results = await asyncio.gather(
+                            *(asyncio.wait_for(pending, SEND_TIMEOUT) for _, pending in waiting),
+                            return_exceptions=True
+                        )
+                    else:
+                        results = ()
+                    
+                    # Remove disconnected clients
+                    for (websocket, _), result in zip(waiting, results):
+                        if result is None:
+                            continue
+                        if isinstance(result, asyncio.TimeoutError):
+                            logger.warning("Client send timed out, closing connection")
+                            task = asyncio.create_task(websocket.close())
+                            self.closing_tasks.add(task)
+                            task.add_done_callback(self.closing_tasks.discard)
+                        elif not isinstance(result, websockets.exceptions.ConnectionClosed):
+                            logger.warning("Error sending to client: %s", result)
+                        self.remove_client(websocket)
                 
-                # Small delay to prevent busy waiting
-                await asyncio.sleep(0.01)
+                # queue.get() returns without suspending while payloads are waiting, so under sustained
+                # load let register/close and the TCP readers run every so often
+                broadcasts += 1
+                if broadcasts % YIELD_EVERY == 0:
+                    await asyncio.sleep(0)
                 
             except Exception as e:
-                logger.error(f"Broadcast error: {e}")
+                logger.error("Broadcast error: %s", e)
                 await asyncio.sleep(1)
         
         logger.info("Data broadcast task stopped")
 
     async def start_websocket_server(self):
-        """Start the WebSocket server"""
+        """Start the TCP ingest and WebSocket servers on the running event loop"""
         self.running = True
+        self.queue = asyncio.Queue()  # Kept short by the watermarks in enqueue_payload()
         
         try:
-            # Start WebSocket server
-            self.server = await websockets.serve(
-                self.register,
+            # Start TCP server; it shares this loop with the broadcaster, so no thread hand-off is needed
+            self.tcp_server = await asyncio.start_server(
+                self.handle_tcp_client,
                 "localhost",
-                8765,
+                8766,
+                limit=MAX_LINE_BYTES
+            )
+            # Set on the listening sockets so accepted connections inherit it before the handshake,
+            # which is what lets the receive window scale up to it
+            for sock in self.tcp_server.sockets:
+                set_buffer_size(sock, socket.SO_RCVBUF, TCP_RCVBUF_SIZE, "TCP ingest SO_RCVBUF")
+            logger.info("TCP server started on localhost:8766")
+            
+            # Start WebSocket server
+            serve_options = dict(
                 ping_interval=20,
                 ping_timeout=10,
-                close_timeout=10
+                close_timeout=10,
+                compression=None  # Small JSON telemetry gains little from deflate but pays its CPU on every send
             )
+            self.server = await websockets.serve(self.register, "localhost", 8765, **serve_options)
+            for sock in self.server.sockets:
+                set_buffer_size(sock, socket.SO_SNDBUF, WS_SNDBUF_SIZE, "WebSocket SO_SNDBUF")
             logger.info("WebSocket server started on ws://localhost:8765")
             
+            if UNIX_SOCKET_AVAILABLE:
+                try:
+                    self.unix_server = await websockets.unix_serve(self.register, UNIX_SOCKET_PATH, **serve_options)
+                    logger.info("WebSocket server also listening on unix socket %s", UNIX_SOCKET_PATH)
+                except OSError as e:
+                    logger.warning("Could not listen on unix socket %s: %s", UNIX_SOCKET_PATH, e)
+            
             # Start broadcast task
             self.broadcast_task = asyncio.create_task(self.broadcast_data())
             
@@ -140,65 +363,49 @@ class WebSocketServer:
             await self.server.wait_closed()
             
         except Exception as e:
-            logger.error(f"WebSocket server error: {e}")
+            logger.error("WebSocket server error: %s", e)
         finally:
             self.running = False
+            if self.tcp_server:
+                self.tcp_server.close()
+            if self.unix_server:
+                self.unix_server.close()
+                try:
+                    os.unlink(UNIX_SOCKET_PATH)
+                except OSError:
+                    pass
             if self.broadcast_task:
                 self.broadcast_task.cancel()
 
-class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
-    """TCP Server that handles each client in a separate thread"""
-    allow_reuse_address = True
-    daemon_threads = True
-
-def run_websocket_server():
-    """Run WebSocket server in separate thread"""
-    loop = asyncio.new_event_loop()
+def run_servers():
+    """Run the TCP and WebSocket servers on one event loop until interrupted"""
+    loop = uvloop.new_event_loop() if UVLOOP_AVAILABLE else asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     
     server = WebSocketServer()
     try:
-        logger.info("Starting WebSocket server thread")
         loop.run_until_complete(server.start_websocket_server())
-    except KeyboardInterrupt:
-        logger.info("WebSocket server interrupted")
     finally:
+        # Close TCP connections first: cancelling a handler blocked in readuntil() makes the
+        # stream's connection callback log the CancelledError as an error
+        loop.run_until_complete(server.stop_tcp())
+        # Then let the broadcaster and WebSocket connections unwind before the loop goes away
+        pending = asyncio.all_tasks(loop)
+        for task in pending:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
         loop.close()
 
 def main():
-    global data_queue
-    
-    # Create shared data queue
-    data_queue = queue.Queue(maxsize=1000)  # Limit queue size to prevent memory issues
-    
     try:
-        # Start TCP server
-        logger.info("Starting TCP server on localhost:8766")
-        tcp_server = ThreadedTCPServer(('localhost', 8766), TCPRequestHandler)
-        tcp_thread = threading.Thread(target=tcp_server.serve_forever, daemon=True)
-        tcp_thread.start()
-        logger.info("TCP server started successfully")
-
-        # Start WebSocket server
-        logger.info("Starting WebSocket server")
-        ws_thread = threading.Thread(target=run_websocket_server, daemon=True)
-        ws_thread.start()
-        
-        # Keep main thread alive
-        logger.info("All servers started. Press Ctrl+C to stop.")
-        while True:
-            time.sleep(1)
-            
+        logger.info("Starting TCP and WebSocket servers. Press Ctrl+C to stop.")
+        run_servers()
     except KeyboardInterrupt:
         logger.info("Shutting down servers...")
-        tcp_server.shutdown()
-        tcp_server.server_close()
-        logger.info("Servers stopped")
     except Exception as e:
-        logger.error(f"Server error: {e}")
-        if 'tcp_server' in locals():
-            tcp_server.shutdown()
-            tcp_server.server_close()
+        logger.error("Server error: %s", e)
+    finally:
+        logger.info("Servers stopped")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()